@@ -1,13 +1,12 @@
-
 # Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
 # SPDX-License-Identifier: Apache-2.0
 
-import json
+import orjson
 from pathlib import Path
 from typing import Any, Dict, Optional
 
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, TypeAdapter
 
 
 class DISCOX(BaseModel):
@@ -24,24 +23,43 @@ class DISCOX(BaseModel):
     secondary_domain:str=Field(alias="Secondary_Domain")
 
 
+    _dumped: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+
+
     def extra_fields(self) -> Dict[str, Any]:
         return {
             "reference_list": self.reference_list,
             "prompt": self.prompt,
         }
 
+    def dumped(self) -> Dict[str, Any]:
+        """
+        Cached model_dump(by_alias=True). Tasks are immutable after loading,
+        so the serialized form is computed once and reused on retries.
+        Callers must copy before mutating.
+        """
+        if self._dumped is None:
+            self._dumped = self.model_dump(by_alias=True)
+        return self._dumped
+
 
 def load_json(filename:str):
     if not filename.endswith(".json"):
         raise ValueError("filename must endswith .json")
-    with open(filename, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(filename, "rb") as f:
+        data = orjson.loads(f.read())
     return data
 
+# Validating the whole file in one batched call avoids a Python-level
+# __init__ + per-field validation round per row.
+_TASKS_ADAPTER = TypeAdapter(list[DISCOX])
+
+
 def load_tasks(filename:str):
-    task=DISCOX
-    data=load_json(filename)
-    return [task(**item) for item in data]
+    if not filename.endswith(".json"):
+        raise ValueError("filename must endswith .json")
+    with open(filename, "rb") as f:
+        return _TASKS_ADAPTER.validate_json(f.read())
 
 
 
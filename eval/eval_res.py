@@ -1,98 +1,180 @@
 # Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
 # SPDX-License-Identifier: Apache-2.0
 
-import json
+import asyncio
 import re
 
+import litellm
+import orjson
+from tenacity import AsyncRetrying, RetryError, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 
-from runs.run import litellm_generate
+
+from runs.run import litellm_agenerate
 from dataset.data import DISCOX
 from eval.prompts import *
 from log import logger
 
 
+_JSON_FENCE = re.compile(r"```(?:json)?\s*([\s\S]*?)\s*```")
+_INSTRUCT_PROBLEM = re.compile(r"是否存在问题：\s*([^\s])")
+
+
+ACCURACY_MAPPING = {
+    "整体无问题": 0,
+    '普通':     -5,  'Major':   -5,
+    '严重': -10, 'Critical': -10,
+    '非常严重': -50, 'Extremely Critical': -50,
+}
+CORRECTNESS_MAPPING = {
+    '错误': -5,
+    '正确':  0,
+}
+FLUENCY_MAPPING= {
+    '无问题': 0,
+    '有问题':  -2,
+    "整体无问题": 0,
+}
+APPROPIATE_MAPPING = {
+    '无问题':  0,
+    '有问题': -5,
+    "整体无问题": 0,
+}
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else []
+
+
 def extract_json_string(text: str) -> str:
-    
-    match = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text)
+
+    match = _JSON_FENCE.search(text)
     if match:
         return match.group(1).strip()
     return text
 
 
-def safe_json_call(func):
-    def wrapper(*args, retries=3, **kwargs):
-        res = None
-        for attempt in range(1, retries + 1):
-            try:
-                res=func(*args, **kwargs)
-                return json.loads(res)
-            except Exception as e:
-                logger.info(f"Attempt {attempt}/{retries} failed when judging: {e}\n output result:{res}")
+def _log_judge_retry(retry_state):
+    logger.info(f"Attempt {retry_state.attempt_number} failed when judging: {retry_state.outcome.exception()}")
 
+
+def safe_json_call(func):
+    # Backoff grows exponentially with jitter so retries spread out instead of
+    # hammering a rate-limited provider. A decode failure flips refresh_cache
+    # so the retry bypasses the judge disk cache and genuinely re-samples the
+    # LLM instead of replaying the same unparsable reply from disk.
+    async def wrapper(*args, **kwargs):
+        refresh=False
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(5),
+                wait=wait_exponential_jitter(initial=1, max=30),
+                retry=retry_if_exception_type((orjson.JSONDecodeError, TypeError, litellm.RateLimitError, litellm.APIConnectionError)),
+                before_sleep=_log_judge_retry,
+            ):
+                with attempt:
+                    res=await func(*args, refresh_cache=refresh, **kwargs)
+                    try:
+                        return orjson.loads(res)
+                    except (orjson.JSONDecodeError, TypeError):
+                        # replaying a cached reply can only reproduce this
+                        # failure; force a fresh sample on the next attempt
+                        refresh=True
+                        raise
+        except RetryError as e:
+            logger.info(f"All attempts failed when judging: {e.last_attempt.exception()}")
         return []
     return wrapper
 
 
-def eval_result_by_llm(sp,up,judge_model,**kwargs):
-    
+# Opt-in semantic cache for judge calls, installed via enable_semantic_cache
+_semantic_cache=None
+
+
+def enable_semantic_cache():
+    """
+    Turn on the embedding-based judge cache (see eval/semantic_cache.py).
+    Requires the optional faiss-cpu and sentence-transformers packages.
+    """
+    global _semantic_cache
+    import atexit
+    from eval.semantic_cache import SemanticCache
+    _semantic_cache=SemanticCache()
+    atexit.register(_semantic_cache.save)
+
+
+async def eval_result_by_llm(sp,up,judge_model,refresh_cache=False,**kwargs):
+
     user_prompt=up.format(**kwargs)
-    judge_input=[{"role":"system","content":sp},{"role":"user","content":user_prompt}]
-    judgeres=litellm_generate(messages=judge_input,model=judge_model)
-    
-    return extract_json_string(judgeres)
+    # Embedding and index lookups are CPU-bound, so they run in a worker thread
+    # to keep the event loop free. Skipped entirely on refresh_cache retries:
+    # an exact-match hit would just replay the reply being retried away
+    if _semantic_cache is not None and not refresh_cache:
+        cached=await asyncio.to_thread(_semantic_cache.get,sp+user_prompt)
+        if cached is not None:
+            return cached
+    # The system prompt is the same verbatim string across all tasks; only the
+    # user message varies. Marking it with cache_control lets providers that
+    # support prompt caching reuse the prefilled prefix between calls.
+    judge_input=[{"role":"system","content":sp,"cache_control":{"type":"ephemeral"}},{"role":"user","content":user_prompt}]
+    judgeres=await litellm_agenerate(messages=judge_input,model=judge_model,refresh_cache=refresh_cache)
+
+    res=extract_json_string(judgeres)
+    if _semantic_cache is not None and not refresh_cache:
+        await asyncio.to_thread(_semantic_cache.set,sp+user_prompt,res)
+    return res
 
 
 @safe_json_call
-def judge_accuracy(ori_text:str,response:str,judge_model):
+async def judge_accuracy(ori_text:str,response:str,judge_model,refresh_cache=False):
     try:
-        return eval_result_by_llm(accuracy_sp,up,judge_model,ori_text=ori_text,response=response)
+        return await eval_result_by_llm(accuracy_sp,up,judge_model,refresh_cache=refresh_cache,ori_text=ori_text,response=response)
     except Exception as e:
-        
+
         return None
 
 
 @safe_json_call
-def judge_checkpoint(ori_text:str,response:str,checkpoints,judge_model:str):
+async def judge_checkpoint(ori_text:str,response:str,checkpoints,judge_model:str,refresh_cache=False):
     try:
-        return eval_result_by_llm(checkpoints_sp,checkpoints_up,judge_model,ori_text=ori_text,response=response,checkpoints=checkpoints)
+        return await eval_result_by_llm(checkpoints_sp,checkpoints_up,judge_model,refresh_cache=refresh_cache,ori_text=ori_text,response=response,checkpoints=checkpoints)
     except Exception as e:
-        
+
         return None
 
 
 @safe_json_call
-def judge_fluency(ori_text:str,response:str,judge_model:str):
+async def judge_fluency(ori_text:str,response:str,judge_model:str,refresh_cache=False):
     try:
-        return eval_result_by_llm(fluency_sp,up,judge_model,ori_text=ori_text,response=response)
+        return await eval_result_by_llm(fluency_sp,up,judge_model,refresh_cache=refresh_cache,ori_text=ori_text,response=response)
     except Exception as e:
-        
+
         return None
 
 
 @safe_json_call
-def judge_appropiate(ori_text:str,response:str,judge_model:str):
+async def judge_appropiate(ori_text:str,response:str,judge_model:str,refresh_cache=False):
     try:
-        return eval_result_by_llm(appropiate_sp,up,judge_model,ori_text=ori_text,response=response)
+        return await eval_result_by_llm(appropiate_sp,up,judge_model,refresh_cache=refresh_cache,ori_text=ori_text,response=response)
     except Exception as e:
-        
+
         return None
 
 
-def self_critique_judge(acc:list,flu:list,ckpt:list,appropiate:list,judge_model:str):
-        res=eval_result_by_llm(self_critique_sp,self_critique_up,judge_model,accuracy_judge_result=acc,fluency_judge_result=flu,checkpoints_judge_result=ckpt,style_judge_result=appropiate)
+async def self_critique_judge(acc:list,flu:list,ckpt:list,appropiate:list,judge_model:str):
+        res=await eval_result_by_llm(self_critique_sp,self_critique_up,judge_model,accuracy_judge_result=acc,fluency_judge_result=flu,checkpoints_judge_result=ckpt,style_judge_result=appropiate)
         return res
-    
-    
+
+
 
 @safe_json_call
-def final_judge(sp:str,up:str,judge_model:str,**kwargs):
+async def final_judge(sp:str,up:str,judge_model:str,refresh_cache=False,**kwargs):
     try:
-        return eval_result_by_llm(sp,up,judge_model,**kwargs)
+        return await eval_result_by_llm(sp,up,judge_model,refresh_cache=refresh_cache,**kwargs)
     except Exception as e:
         return None
 
 
-def metrics(task:DISCOX,response:str,judge_model:str):
+async def metrics(task:DISCOX,response:str,judge_model:str):
     """
     Evaluate a task and a response by MetricS.
     Args:
@@ -104,26 +186,45 @@ def metrics(task:DISCOX,response:str,judge_model:str):
         tuple: A tuple containing the scores of different dimensions (accuracy, checkpoints, fluency, appropiate), total score, and detailed judgement.
     """
     detailed_judgement={}
-    instruct_res=eval_result_by_llm(instruct_sp,instruct_up,judge_model,prompt=task.ori_text,response=response)
+    instruct_res=await eval_result_by_llm(instruct_sp,instruct_up,judge_model,prompt=task.ori_text,response=response)
+    match = _INSTRUCT_PROBLEM.search(instruct_res) if instruct_res else None
+    if not match:
+        # Malformed instruct judgement; re-sample once before giving up so a
+        # flaky response doesn't get waved through to 8 more judge calls.
+        # refresh_cache bypasses the disk cache, otherwise the retry would be
+        # a guaranteed hit on the same key and replay the same bad reply
+        logger.info(f"instruct judgement unparsable for task {task.prompt_id}, re-sampling")
+        instruct_res=await eval_result_by_llm(instruct_sp,instruct_up,judge_model,refresh_cache=True,prompt=task.ori_text,response=response)
+        match = _INSTRUCT_PROBLEM.search(instruct_res) if instruct_res else None
     detailed_judgement["instruction_following"]=instruct_res
-    match = re.search(r"是否存在问题：\s*([^\s])", instruct_res)
-    if match:
-       problem=match.group(1)
-       if problem=="是":
-           return (0,0,0),0,detailed_judgement
+    if not match:
+        logger.warning(f"instruct judgement still unparsable for task {task.prompt_id}, skipping downstream judges")
+        return (0,0,0),0,detailed_judgement
+    problem=match.group(1)
+    if problem=="是":
+        return (0,0,0),0,detailed_judgement
 
 
-    acc_res=judge_accuracy(task.ori_text,response,judge_model)
-    ckpt_res=judge_checkpoint(task.ori_text,response,task.reference_list,judge_model)
-    flu_res=judge_fluency(task.ori_text,response,judge_model)
-    appropiate_res=judge_appropiate(task.ori_text,response,judge_model)
+    # The four initial judges are independent, so fire them concurrently
+    acc_res,ckpt_res,flu_res,appropiate_res=await asyncio.gather(
+        judge_accuracy(task.ori_text,response,judge_model),
+        judge_checkpoint(task.ori_text,response,task.reference_list,judge_model),
+        judge_fluency(task.ori_text,response,judge_model),
+        judge_appropiate(task.ori_text,response,judge_model),
+    )
 
-    adjustment_res=self_critique_judge(acc_res,flu_res,ckpt_res,appropiate_res,judge_model)
+    adjustment_res=await self_critique_judge(acc_res,flu_res,ckpt_res,appropiate_res,judge_model)
     logger.info(f"adjustment_res:{adjustment_res}")
-    acc_finalres=final_judge(accuracy_final_sp,accuracy_final_up,judge_model,accuracy_judge_result=acc_res,adjustment=adjustment_res)
-    appropiate_finalres=final_judge(appropiate_final_sp,appropiate_final_up,judge_model,style_judge_result=appropiate_res,adjustment=adjustment_res)
-    ckpt_finalres=final_judge(checkpoints_final_sp,checkpoints_final_up,judge_model,checkpoints_judge_result=ckpt_res,adjustment=adjustment_res)
-    flu_finalres=final_judge(fluency_final_sp,fluency_final_up,judge_model,fluency_judge_result=flu_res,adjustment=adjustment_res)
+    # One combined final pass covers all four dimensions in a single round-trip.
+    # Each dimension is coerced to a list so a partially malformed reply (e.g.
+    # a scalar under one key) degrades like a failed per-dimension call
+    combined_finalres=await final_judge(combined_final_sp,combined_final_up,judge_model,accuracy_judge_result=acc_res,checkpoints_judge_result=ckpt_res,fluency_judge_result=flu_res,style_judge_result=appropiate_res,adjustment=adjustment_res)
+    if not isinstance(combined_finalres,dict):
+        combined_finalres={}
+    acc_finalres=_as_list(combined_finalres.get("accuracy"))
+    ckpt_finalres=_as_list(combined_finalres.get("checkpoints"))
+    flu_finalres=_as_list(combined_finalres.get("fluency"))
+    appropiate_finalres=_as_list(combined_finalres.get("appropiate"))
     scores=calculate_score(acc_finalres,ckpt_finalres,flu_finalres,appropiate_finalres)
     detailed_judgement["initial_judgement"]={"accuracy":acc_res,"checkpoints":ckpt_res,"fluency":flu_res,"appropiate":appropiate_res}
     detailed_judgement["self_critique"]=adjustment_res
@@ -135,76 +236,57 @@ def metrics(task:DISCOX,response:str,judge_model:str):
     return scores,sum(scores),detailed_judgement
 
 
-def calculate_score(acc:list,ckpt:list,flu:list,appropiate:list):
+def calculate_score(acc:list[dict],ckpt:list[dict],flu:list[dict],appropiate:list[dict])->tuple[int,int,int]:
     """
     Calculate the final score based on the final judge results 3 different dimensions.
-    
+
     Args:
-        acc (list): The accuracy final results.
-        ckpt (list): The checkpoints final results.
-        flu (list): The fluency final judge results.
-        appropiate (list): The appropiate final judge results.
-        
+        acc (list[dict]): The accuracy final results.
+        ckpt (list[dict]): The checkpoints final results.
+        flu (list[dict]): The fluency final judge results.
+        appropiate (list[dict]): The appropiate final judge results.
+
     Returns:
         tuple: A tuple of scores for three dimension (accuracy,fluency, appropiate).
     """
 
 
-    ACCURACY_MAPPING = {
-        "整体无问题": 0,
-    '普通':     -5,  'Major':   -5,
-    '严重': -10, 'Critical': -10,
-    '非常严重': -50, 'Extremely Critical': -50,
-}
-    CORRECTNESS_MAPPING = {
-    '错误': -5,
-    '正确':  0,
-}
-    FLUENCY_MAPPING= {
-    '无问题': 0,
-    '有问题':  -2,
-    "整体无问题": 0,    
-}
-    APPROPIATE_MAPPING = {
-    '无问题':  0,
-    '有问题': -5,
-    "整体无问题": 0,
-}
     # calculating accuracy score
     acc_score=60
     for item in acc:
-        if "问题严重程度" in item and item["问题严重程度"] in ACCURACY_MAPPING:
-            acc_score+=ACCURACY_MAPPING[item["问题严重程度"]]
-        else:
+        delta=ACCURACY_MAPPING.get(item.get("问题严重程度")) if isinstance(item,dict) else None
+        if delta is None:
             logger.warning(f"Unknown severity level: {item}. Defaulting to -5 points.")
             acc_score-=5
-    for item in ckpt:
-        #logger.info(item) 
-        if "判断结果" in item and item["判断结果"] in CORRECTNESS_MAPPING:
-            acc_score+=CORRECTNESS_MAPPING[item["判断结果"]]
         else:
-            pass
+            acc_score+=delta
+    for item in ckpt:
+        #logger.info(item)
+        delta=CORRECTNESS_MAPPING.get(item.get("判断结果")) if isinstance(item,dict) else None
+        if delta is None:
             logger.warning(f"Unknown correctness level: {item}. Defaulting to consider it right.")
+        else:
+            acc_score+=delta
     acc_score=max(acc_score,0)
     # calculating fluency score
     flu_score=20
     for item in flu:
-        if "问题严重程度" in item and item["问题严重程度"] in FLUENCY_MAPPING:
-            flu_score+=FLUENCY_MAPPING[item["问题严重程度"]]
-        else:
+        delta=FLUENCY_MAPPING.get(item.get("问题严重程度")) if isinstance(item,dict) else None
+        if delta is None:
             logger.warning(f"Unknown severity level: {item}. Defaulting to -0 points.")
-            flu_score-=0
+        else:
+            flu_score+=delta
     flu_score=max(flu_score,0)
-    
+
     # calculating appropiate score
     appropiate_score=20
     for item in appropiate:
-        if "问题严重程度" in item and item["问题严重程度"] in APPROPIATE_MAPPING:
-            appropiate_score+=APPROPIATE_MAPPING[item["问题严重程度"]]
-        else:
+        delta=APPROPIATE_MAPPING.get(item.get("问题严重程度")) if isinstance(item,dict) else None
+        if delta is None:
             logger.warning(f"Unknown severity level: {item}. Defaulting to -0 points.")
-            appropiate_score+=0
+        else:
+            appropiate_score+=delta
     appropiate_score=max(appropiate_score,0)
-    
+
     return acc_score,flu_score,appropiate_score
 
@@ -490,4 +490,66 @@ appropiate_final_sp="""你是一个指令遵循专员，请帮我处理两段文
    "问题严重程度": "整体无问题"
 }]
 
-以下是你本次的任务："""
\ No newline at end of file
+以下是你本次的任务："""
+combined_final_sp="""你是一个指令遵循专员，请帮我处理几段文本。
+不同专家从四个维度对译文进行评估，彼此之间可能存在重复情况。
+
+我将给你【accuracy】【checkpoints】【fluency】【style】四个维度原本的评估情况和关于重复情况的调整建议【adjustment】，请根据调整建议一次性输出四个维度正确的评估结果。
+
+拿到文本后请先仔细阅读【adjustment】，逐个维度确认原本评估的内容是否需要调整。如果需要，请根据建议调整，不需要，则将该维度原本的评估建议直接输出。
+
+禁止对原有的评估内容或调整建议进行任何更改。
+
+请以json格式输出正确判分情况，不要输出要求格式以外的任何内容。输出为一个json对象，包含accuracy、checkpoints、fluency、appropiate四个键，每个键对应该维度调整后的评估列表，列表内条目格式与原评估一致：
+
+{
+ "accuracy": [{
+  "问题序号": "由你生成，从1开始",
+  "问题段落": "段落号",
+  "问题类型": "错译/漏译/未译/增译/其他",
+  "问题分析": "你的分析",
+  "问题严重程度": "普通/严重/非常严重"
+ }],
+ "checkpoints": [{
+  "问题序号": "1",
+  "问题段落": "段落号",
+  "问题分析": "你的分析",
+  "判断结果": "正确/错误"
+ }],
+ "fluency": [{
+  "问题序号": "由你生成，从1开始",
+  "问题段落": "段落号",
+  "问题类型": "语言自然度/语法正确性/逻辑连贯性/术语一致性",
+  "问题分析": "你的分析",
+  "问题严重程度": "有问题"
+ }],
+ "appropiate": [{
+  "问题序号": "由你生成，从1开始",
+  "段落序号": "段落号",
+  "问题类型": "风格/情感色彩/文采/文化适应度",
+  "问题分析": "你的分析",
+  "问题严重程度": "有问题"
+ }]
+}
+
+如果某个维度不存在任何问题，该维度输出：
+[{
+ "问题严重程度": "整体无问题"
+}]
+
+以下是你本次的任务："""
+
+combined_final_up="""【accuracy评估】
+{accuracy_judge_result}
+
+【checkpoints评估】
+{checkpoints_judge_result}
+
+【fluency评估】
+{fluency_judge_result}
+
+【style评估】
+{style_judge_result}
+
+【重复扣分情况】
+{adjustment}"""
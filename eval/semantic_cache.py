@@ -0,0 +1,72 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pickle
+import threading
+
+
+from log import logger
+
+
+class SemanticCache:
+    """
+    Embedding-based cache for judge LLM calls.
+
+    Near-duplicate judge prompts (shared boilerplate, templated source texts)
+    produce near-duplicate judgements; a hit on the closest previous prompt
+    above the similarity threshold returns its cached response in milliseconds
+    instead of paying a full LLM round-trip. Trades a little fidelity for cost,
+    so it is opt-in via the --semantic-cache flag.
+
+    Requires the optional faiss-cpu and sentence-transformers packages.
+    """
+
+    def __init__(self, path: str = "./.semantic_cache", threshold: float = 0.97, model_name: str = "all-MiniLM-L6-v2"):
+        # Imported lazily so these heavyweight dependencies stay optional
+        import faiss
+        from sentence_transformers import SentenceTransformer
+
+        self.threshold = threshold
+        self.encoder = SentenceTransformer(model_name)
+        self.index = faiss.IndexFlatIP(self.encoder.get_sentence_embedding_dimension())
+        self.responses: list[str] = []
+        # get/set run from asyncio.to_thread workers; faiss index mutation is
+        # not thread-safe, so all index access is serialized
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        self._index_file = os.path.join(path, "index.faiss")
+        self._responses_file = os.path.join(path, "responses.pkl")
+        if os.path.exists(self._index_file) and os.path.exists(self._responses_file):
+            self.index = faiss.read_index(self._index_file)
+            with open(self._responses_file, "rb") as f:
+                self.responses = pickle.load(f)
+            logger.info(f"semantic cache loaded with {self.index.ntotal} entries")
+
+    def _embed(self, text: str):
+        return self.encoder.encode([text], normalize_embeddings=True)
+
+    def get(self, text: str):
+        emb = self._embed(text)
+        with self._lock:
+            if self.index.ntotal == 0:
+                return None
+            scores, ids = self.index.search(emb, 1)
+            if scores[0][0] >= self.threshold:
+                return self.responses[ids[0][0]]
+        return None
+
+    def set(self, text: str, response: str):
+        emb = self._embed(text)
+        with self._lock:
+            self.index.add(emb)
+            self.responses.append(response)
+
+    def save(self):
+        import faiss
+
+        with self._lock:
+            faiss.write_index(self.index, self._index_file)
+            with open(self._responses_file, "wb") as f:
+                pickle.dump(self.responses, f)
@@ -3,25 +3,17 @@
 
 import logging
 
-class Logger:
-    def __init__(self, name="DISCOX", level=logging.INFO):
-        self.logger = logging.getLogger(name)
-        self.logger.setLevel(level)
-
-        if not self.logger.handlers:  
-            formatter = logging.Formatter(
-                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
-
-            # Console Log
-            console_handler = logging.StreamHandler()
-            console_handler.setLevel(level)
-            console_handler.setFormatter(formatter)
-            self.logger.addHandler(console_handler)
-
-    def __getattr__(self, item):
-        return getattr(self.logger, item)
+# Logger Instance
+logger = logging.getLogger("DISCOX")
+logger.setLevel(logging.INFO)
 
+if not logger.handlers:
+    formatter = logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
 
-# Logger Instance
-logger = Logger().logger
\ No newline at end of file
+    # Console Log
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
@@ -1,43 +1,43 @@
 # Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
 # SPDX-License-Identifier: Apache-2.0
 
-import json
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import orjson
 import argparse
 from tqdm import tqdm
 import datetime
 import os
 from dotenv import load_dotenv
-import glob
+import fnmatch
+import itertools
 import traceback
 
 
 from log import logger
 from dataset.data import load_tasks,DISCOX
-from eval.eval_res import metrics
-from runs.run import litellm_generate
+from eval.eval_res import metrics,enable_semantic_cache
+from runs.run import litellm_agenerate,set_rate_limit
 
 load_dotenv()
 
 
-def run_task(task:DISCOX,model:str,judgemodel:str):
+async def run_task(task:DISCOX,model:str,judgemodel:str):
     """
     Run a single DISCOX task.
     Args:
         task (DISCOX): The DISCOX task to run.
         model (str): The model to be evaluated.
         judgemodel (str): The model to be used for judging.
-        
+
     Returns:
         dict: A dictionary containing the task details, model output, domain scores, final score, and detailed judgement.
     """
 
-    
-    output=litellm_generate(messages=[{"role":"user","content":task.prompt}],model=model,judging_mode=False,max_tokens=20000)   
-    judge_res,final_score,detailed_judgement=metrics(task,output,judgemodel)
 
-    d = task.model_dump(by_alias=True)
+    output=await litellm_agenerate(messages=[{"role":"user","content":task.prompt}],model=model,judging_mode=False,max_tokens=20000)
+    judge_res,final_score,detailed_judgement=await metrics(task,output,judgemodel)
+
+    d = dict(task.dumped())
     d["model_output"]=output
     d["domain_score"]=judge_res
     d["score"]=final_score
@@ -46,25 +46,34 @@ def run_task(task:DISCOX,model:str,judgemodel:str):
 
 
 def get_latest_jsonl_file(folder_path:str="./results",modelname:str="",taskname:str=""):
-    # Check whether the model already evaluated
-    all_files = glob.glob(os.path.join(folder_path, f"*{modelname}*{taskname}*.jsonl"))
-    if not all_files:
+    # Check whether the model already evaluated. One scandir pass stats each
+    # candidate exactly once instead of glob + getctime stat'ing twice
+    pattern = f"*{modelname}*{taskname}*.jsonl"
+    latest_file = None
+    latest_ctime = -1.0
+    try:
+        with os.scandir(folder_path) as it:
+            for entry in it:
+                if not fnmatch.fnmatch(entry.name, pattern):
+                    continue
+                # Get The latest file by creation time
+                ctime = entry.stat().st_ctime
+                if ctime > latest_ctime:
+                    latest_ctime, latest_file = ctime, entry.path
+    except FileNotFoundError:
         return None  #No corresponding file found
-
-    # Get The latest file by creation time
-    latest_file = max(all_files, key=os.path.getctime)
     return latest_file
 
 
 def run_all_sync(tasks:list[DISCOX], model:str, judgemodel:str, concurrency:int=24):
     """
-    Run all DISCOX tasks synchronously.
+    Run all DISCOX tasks concurrently on an asyncio event loop and block until done.
     Args:
         tasks (list[DISCOX]): The list of DISCOX tasks to run.
         model (str): The model to be evaluated.
         judgemodel (str): The model to be used for judging.
-        concurrency (int, optional): The number of concurrent threads. Defaults to 24.
-        
+        concurrency (int, optional): The number of concurrent in-flight tasks. Defaults to 24.
+
     Returns:
         res:dict: A dictionary containing the task details, model output, domain scores, final score, and detailed judgement.It will be
         saved to a json file.
@@ -78,16 +87,23 @@ def run_all_sync(tasks:list[DISCOX], model:str, judgemodel:str, concurrency:int=
     tasksname = tasks[0].__class__.__name__
     last_run=get_latest_jsonl_file(modelname=modelname,taskname=tasksname)
     if last_run:
+        # Single pass: parse each previous line once, collecting both the
+        # finished prompt_ids and the result dicts
+        already_run_data=set()
+        previous_results=[]
         with open(last_run,"r",encoding="utf-8") as f:
-            lines=f.readlines()
-            already_run_data = [json.loads(line)["prompt_id"] for line in lines if "prompt_id" in json.loads(line)]
-            if len(already_run_data)<len(tasks):
-                tasks=[task for task in tasks if task.prompt_id not in already_run_data]
-                results=[json.loads(line) for line in lines]
-            else:
-                last_run=None
-                logger.info(f"all tasks have been run in last experiments starting a new task,total:{len(tasks)}")
-            
+            for line in f:
+                d=orjson.loads(line)
+                previous_results.append(d)
+                if "prompt_id" in d:
+                    already_run_data.add(d["prompt_id"])
+        if len(already_run_data)<len(tasks):
+            tasks=[task for task in tasks if task.prompt_id not in already_run_data]
+            results=previous_results
+        else:
+            last_run=None
+            logger.info(f"all tasks have been run in last experiments starting a new task,total:{len(tasks)}")
+
     else:
         logger.info(f"no previous run on this model,total:{len(tasks)}")
 
@@ -102,39 +118,51 @@ def run_all_sync(tasks:list[DISCOX], model:str, judgemodel:str, concurrency:int=
         final_file = os.path.join(output_dir, f"{formatted_time}-{modelname}-{tasksname}result.json")
     else:
         jsonl_file=last_run
-        final_file=last_run.replace("partial.jsonl","result.json")
-
-    
-    completed_counter = {"count": 0}
-    counter_lock = threading.Lock()
+        # Explicit suffix swap; the old str.replace silently produced
+        # final_file == jsonl_file for names without the partial suffix
+        if last_run.endswith("partial.jsonl"):
+            final_file=last_run.removesuffix("partial.jsonl")+"result.json"
+        else:
+            final_file=last_run+".result.json"
 
     logger.info("start running")
 
-    
-    def wrapped_run(task):
+
+    async def wrapped_run(task):
         try:
-            res = run_task(task, model, judgemodel)
+            res = await run_task(task, model, judgemodel)
             if "error" in res:
                 logger.error(f"Task {task.prompt_id} failed with error: {res['error']}")
                 raise RuntimeError("Unsupport task")
         except Exception as e:
             res = {"error": str(e), "traceback": traceback.format_exc()}
             logger.error(f"Task {task.prompt_id} exception:\n{traceback.format_exc()}")
-        finally:
-            with counter_lock:
-                completed_counter["count"] += 1
         return res
-    
 
 
-    with ThreadPoolExecutor(max_workers=concurrency) as executor:
-        futures = [executor.submit(wrapped_run, task) for task in tasks]
-        for future in tqdm(as_completed(futures), total=len(futures), desc="Running tasks"):
-            result = future.result()
-            results.append(result)
-            # Write result to jsonl file
-            with open(jsonl_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    async def run_all():
+        # Submit-as-complete window: only `concurrency` task objects exist at
+        # any time, so finished futures are reclaimed instead of all N living
+        # until the end of the run
+        it = iter(tasks)
+        pending = {asyncio.create_task(wrapped_run(task)) for task in itertools.islice(it, concurrency)}
+        # Keep one append handle open for the whole run instead of
+        # reopening the file for every completed task
+        with open(jsonl_file, "a", encoding="utf-8") as f, tqdm(total=len(tasks), desc="Running tasks") as progress:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    results.append(result)
+                    # Write result to jsonl file
+                    f.write(orjson.dumps(result).decode() + "\n")
+                    f.flush()
+                    progress.update(1)
+                    nxt = next(it, None)
+                    if nxt is not None:
+                        pending.add(asyncio.create_task(wrapped_run(nxt)))
+
+    asyncio.run(run_all())
 
     # Calcualte Accuracy
     valid = [v["score"] for v in results if "score" in v]
@@ -148,8 +176,8 @@ def run_all_sync(tasks:list[DISCOX], model:str, judgemodel:str, concurrency:int=
         "model": model,
         "detailed_results": results
     }
-    with open(final_file, "w", encoding="utf-8") as f:
-        json.dump(res, f, ensure_ascii=False, indent=2)
+    with open(final_file, "wb") as f:
+        f.write(orjson.dumps(res, option=orjson.OPT_INDENT_2))
     logger.info(f"Results saved to {final_file}")
 
     return results, acc
@@ -161,12 +189,18 @@ def parse_arguments():
     parser.add_argument("--model", required=True, help="The model to be evaluated name or endpoint ID")
     parser.add_argument("--judgemodel", required=True, help="The judge model name or endpoint ID")
     parser.add_argument("--num_concurrency", type=int, default=32, help="Number of concurrent threads")
+    parser.add_argument("--rpm", type=int, default=None, help="Cap requests per minute per model to stay under provider rate limits")
+    parser.add_argument("--semantic-cache", action="store_true", help="Reuse judge responses for near-duplicate prompts (needs faiss-cpu and sentence-transformers)")
     return parser.parse_args()
 
 
-if __name__=="__main__":  
-    args = parse_arguments()  
+if __name__=="__main__":
+    args = parse_arguments()
 
+    if args.rpm:
+        set_rate_limit(args.rpm)
+    if args.semantic_cache:
+        enable_semantic_cache()
     task = load_tasks(args.filename)
     model = args.model
     judgemodel = args.judgemodel
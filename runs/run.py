@@ -1,11 +1,63 @@
 # Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
 # SPDX-License-Identifier: Apache-2.0
 
+import asyncio
+import hashlib
+import json
 import os
+import random
 from typing import Optional
 
 
+import httpx
 import litellm
+from aiolimiter import AsyncLimiter
+from diskcache import Cache
+
+
+# Share one keep-alive connection pool across all litellm calls so TLS
+# handshakes and DNS lookups are amortized over the whole run instead of
+# being paid per request.
+_pool_limits = httpx.Limits(max_keepalive_connections=64, max_connections=128)
+litellm.client_session = httpx.Client(limits=_pool_limits)
+litellm.aclient_session = httpx.AsyncClient(limits=_pool_limits)
+
+
+# Judge calls run with temperature=0.0, so identical (model, messages) pairs are
+# deterministic and safe to replay from disk across runs / crash resumes.
+_judge_cache = Cache("./.llm_cache")
+
+
+# Optional per-model request-rate cap, configured once via set_rate_limit.
+# Keeps burst traffic under provider RPM tiers instead of eating 429 backoffs.
+_rpm: Optional[int] = None
+_limiters: dict[str, AsyncLimiter] = {}
+
+
+def set_rate_limit(rpm: Optional[int]):
+    """
+    Cap the request rate of litellm_agenerate to `rpm` requests per minute per model.
+    Args:
+        rpm (Optional[int]): Requests per minute, or None to disable limiting.
+    """
+    global _rpm
+    _rpm = rpm
+    _limiters.clear()
+
+
+def _get_limiter(model:str):
+    if _rpm is None:
+        return None
+    limiter = _limiters.get(model)
+    if limiter is None:
+        limiter = AsyncLimiter(_rpm, 60)
+        _limiters[model] = limiter
+    return limiter
+
+
+def _cache_key(model:str, messages:list[dict], top_p:Optional[float]):
+    payload = json.dumps({"m": model, "msgs": messages, "tp": top_p}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
 def litellm_generate(
@@ -38,7 +90,14 @@ def litellm_generate(
     if judging_mode:
         temperature=0.0
         top_p=0.7
-      
+
+    cache_key = None
+    if judging_mode and temperature == 0.0:
+        cache_key = _cache_key(model, messages, top_p)
+        cached = _judge_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     try:
         if not judging_mode:
             api_base = os.environ["CANDIDATE_API_BASE"]
@@ -61,14 +120,106 @@ def litellm_generate(
             kwargs["max_tokens"] = max_tokens
 
         response = litellm.completion(**kwargs)
-        return response["choices"][0]["message"]["content"]
+        content = response["choices"][0]["message"]["content"]
+        if cache_key is not None and content is not None:
+            _judge_cache.set(cache_key, content)
+        return content
 
     except Exception as e:
-        
+
+        return None
+
+
+async def litellm_agenerate(
+    messages: list[dict],
+    model: str,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    judging_mode: Optional[bool] = True,
+    top_p: Optional[float] = None,
+    refresh_cache: bool = False,
+):
+    """
+    Generate model response asynchronously using LiteLLM library.
+    Args:
+        messages (list[dict]): A list of message dictionaries.
+        model (str): The name of the model to use for generation.
+        temperature (Optional[float], optional): The temperature parameter for sampling.
+            Defaults to None.
+        max_tokens (Optional[int], optional): The maximum number of tokens to generate.
+            Defaults to None.
+        judging_mode (Optional[bool], optional): Whether to use judging mode (with
+            temperature=0.0 and top_p=0.7). Defaults to True.
+        top_p (Optional[float], optional): The top-p parameter.
+            Defaults to None.
+        refresh_cache (bool, optional): Skip the disk-cache read and re-sample the
+            model, overwriting the cached entry on success. Lets callers recover
+            when the cached reply turned out to be unusable. Defaults to False.
+    Returns:
+        Optional[str]: The generated response as a string, or None if an error occurs.
+    """
+
+
+
+    if judging_mode:
+        temperature=0.0
+        top_p=0.7
+
+    cache_key = None
+    if judging_mode and temperature == 0.0:
+        cache_key = _cache_key(model, messages, top_p)
+        if not refresh_cache:
+            cached = _judge_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+    try:
+        if not judging_mode:
+            api_base = os.environ["CANDIDATE_API_BASE"]
+            api_key = os.environ["CANDIDATE_API_KEY"]
+        else:
+            api_base = os.environ["JUDGE_API_BASE"]
+            api_key=os.environ["JUDGE_API_KEY"]
+
+
+        kwargs = {
+            "model": model,
+            "top_p": top_p,
+            "messages": messages,
+            "api_base": api_base,
+            "api_key":api_key
+        }
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+
+        limiter = _get_limiter(model)
+        response = None
+        for attempt in range(5):
+            try:
+                if limiter is not None:
+                    async with limiter:
+                        response = await litellm.acompletion(**kwargs)
+                else:
+                    response = await litellm.acompletion(**kwargs)
+                break
+            except litellm.RateLimitError:
+                if attempt == 4:
+                    raise
+                # exponential backoff with jitter before retrying a 429
+                await asyncio.sleep(min(2 ** attempt, 30) + random.uniform(0, 1))
+        content = response["choices"][0]["message"]["content"]
+        if cache_key is not None and content is not None:
+            _judge_cache.set(cache_key, content)
+        return content
+
+    except Exception as e:
+
         return None
 
 
-if __name__=="__main__":        
+if __name__=="__main__":
 
       
     """data=[